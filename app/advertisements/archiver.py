@@ -0,0 +1,113 @@
+"""Move expired and inactive ads into the cold archive partitions.
+
+Meant to be run on a schedule (cron, systemd timer) from the app directory:
+
+    python -m advertisements.archiver
+"""
+import asyncio
+import datetime
+
+from sqlalchemy import extract, false, or_, select, text, update
+
+from database import async_session_maker
+from .models import Advertisement, Complaint, Photo, Recall
+from .price_stats import record
+
+# Ads older than this are archived even if they are still active.
+AD_LIFETIME = datetime.timedelta(days=90)
+BATCH_SIZE = 1000
+
+
+def archivable(cutoff):
+    return (
+        Advertisement.archived == false(),
+        or_(
+            Advertisement.is_active == false(),
+            Advertisement.pub_date < cutoff
+        )
+    )
+
+
+async def create_archive_partition(session, year):
+    name = f"advertisement_archive_{year}"
+    exists = await session.scalar(
+        text("SELECT to_regclass(:name)"), {"name": name}
+    )
+    if exists is not None:
+        return
+    # Rows of this year already sitting in the default partition would make
+    # CREATE ... PARTITION OF fail, so they are moved into the new one.
+    await session.execute(text(
+        "CREATE TEMP TABLE archive_moved "
+        "(LIKE advertisement_archive_default)"
+    ))
+    await session.execute(text(
+        f"WITH moved AS (DELETE FROM advertisement_archive_default "
+        f"WHERE pub_date >= '{year}-01-01' AND pub_date < '{year + 1}-01-01' "
+        f"RETURNING *) INSERT INTO archive_moved SELECT * FROM moved"
+    ))
+    await session.execute(text(
+        f"CREATE TABLE {name} PARTITION OF advertisement_archive "
+        f"FOR VALUES FROM ('{year}-01-01') TO ('{year + 1}-01-01')"
+    ))
+    await session.execute(text(
+        "INSERT INTO advertisement_archive SELECT * FROM archive_moved"
+    ))
+    await session.execute(text("DROP TABLE archive_moved"))
+
+
+async def archive_batch(session, cutoff):
+    # The batch is locked first and the partitions for its years are
+    # created in the same transaction, so no row can reach the default
+    # partition in between.
+    batch = await session.execute(
+        select(
+            Advertisement.id, extract('year', Advertisement.pub_date)
+        ).filter(*archivable(cutoff)).limit(BATCH_SIZE).with_for_update()
+    )
+    batch = batch.all()
+    if not batch:
+        await session.commit()
+        return 0
+    for year in {int(year) for _, year in batch}:
+        await create_archive_partition(session, year)
+    archived = await session.execute(
+        update(Advertisement).where(
+            Advertisement.id.in_([ad_id for ad_id, _ in batch]),
+            Advertisement.archived == false()
+        ).values(archived=True).returning(
+            Advertisement.id, Advertisement.category_id, Advertisement.type,
+            Advertisement.price
+        ).execution_options(synchronize_session=False)
+    )
+    archived = archived.all()
+    ids = [ad.id for ad in archived]
+    # Price statistics cover live ads only.
+    for ad in archived:
+        await record(session, ad.category_id, ad.type, ad.price, -1)
+    for model in (Photo, Recall, Complaint):
+        await session.execute(
+            update(model).where(
+                model.advertisement_id.in_(ids), model.archived == false()
+            ).values(archived=True).execution_options(
+                synchronize_session=False
+            )
+        )
+    await session.commit()
+    return len(batch)
+
+
+async def archive():
+    cutoff = datetime.datetime.utcnow() - AD_LIFETIME
+    total = 0
+    async with async_session_maker() as session:
+        while True:
+            count = await archive_batch(session, cutoff)
+            total += count
+            if count < BATCH_SIZE:
+                break
+    return total
+
+
+if __name__ == "__main__":
+    print(f"Archived {asyncio.run(archive())} advertisements")
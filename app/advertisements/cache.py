@@ -0,0 +1,46 @@
+import time
+from collections import OrderedDict
+
+# How many groups keep their first feed page in memory and how many ads
+# of that page are stored. Requests for a bigger page bypass the cache.
+FEED_CACHE_GROUPS = 256
+FEED_CACHE_PAGE_SIZE = 20
+# Entries also expire on their own, so writes made by other workers or
+# processes become visible after at most this many seconds.
+FEED_CACHE_TTL = 30
+
+
+class GroupFeedCache:
+    """LRU cache of the first page of each hot group feed."""
+
+    def __init__(self, max_groups=FEED_CACHE_GROUPS, ttl=FEED_CACHE_TTL):
+        self.max_groups = max_groups
+        self.ttl = ttl
+        self._pages = OrderedDict()
+
+    def get(self, group_id, page_size):
+        if page_size > FEED_CACHE_PAGE_SIZE:
+            return None
+        entry = self._pages.get(group_id)
+        if entry is None:
+            return None
+        stored_at, ads = entry
+        if time.monotonic() - stored_at > self.ttl:
+            del self._pages[group_id]
+            return None
+        self._pages.move_to_end(group_id)
+        return ads[:page_size]
+
+    def set(self, group_id, ads):
+        self._pages[group_id] = (time.monotonic(), ads)
+        self._pages.move_to_end(group_id)
+        while len(self._pages) > self.max_groups:
+            self._pages.popitem(last=False)
+
+    def invalidate(self, *group_ids):
+        for group_id in group_ids:
+            if group_id is not None:
+                self._pages.pop(group_id, None)
+
+
+group_feed_cache = GroupFeedCache()
@@ -0,0 +1,148 @@
+import re
+import zlib
+from collections import defaultdict
+
+import numpy as np
+from sqlalchemy import false, select
+
+from .models import Advertisement
+
+# Estimated Jaccard similarity of title+description shingles at which a new
+# ad counts as a near-duplicate of an existing one.
+DUPLICATE_THRESHOLD = 0.8
+# "reject" answers 409, "flag" stores the ad with duplicate_of_id set.
+DUPLICATE_ACTION = "reject"
+# "author" compares only with ads of the same author, "any" with all ads.
+DUPLICATE_SCOPE = "any"
+# Every worker keeps its own copy of the index. A full reload this often
+# picks up ads written through other workers and drops ads the archiver
+# moved out, so both are seen after at most this many seconds.
+DUPLICATE_RELOAD_INTERVAL = 300
+
+NUM_PERMUTATIONS = 64
+# 16 bands of 4 rows: pairs above ~0.5 similarity share a band with high
+# probability, the threshold check then runs on full signatures.
+BANDS = 16
+ROWS_PER_BAND = NUM_PERMUTATIONS // BANDS
+# Character shingles keep small edits from changing most of the set.
+SHINGLE_SIZE = 5
+
+MERSENNE_PRIME = (1 << 31) - 1
+_rng = np.random.default_rng(20231125)
+_A = _rng.integers(1, MERSENNE_PRIME, NUM_PERMUTATIONS, dtype=np.uint64)
+_B = _rng.integers(0, MERSENNE_PRIME, NUM_PERMUTATIONS, dtype=np.uint64)
+
+WORD_RE = re.compile(r"\w+")
+
+
+def shingles(title, description):
+    text = " ".join(
+        WORD_RE.findall(f"{title or ''} {description or ''}".lower())
+    )
+    if len(text) < SHINGLE_SIZE:
+        return {text}
+    return {
+        text[i:i + SHINGLE_SIZE]
+        for i in range(len(text) - SHINGLE_SIZE + 1)
+    }
+
+
+def signature(title, description):
+    hashes = np.fromiter(
+        (zlib.crc32(shingle.encode()) for shingle in
+         shingles(title, description)),
+        dtype=np.uint64,
+    )
+    permuted = (_A[:, None] * hashes[None, :] + _B[:, None]) % MERSENNE_PRIME
+    return permuted.min(axis=1).astype(np.uint32)
+
+
+def similarity(first, second):
+    return float(np.count_nonzero(first == second)) / NUM_PERMUTATIONS
+
+
+class DuplicateIndex:
+    """LSH band index over MinHash signatures of live ads."""
+
+    def __init__(self):
+        # Writes made while ``load`` runs, replayed on the new index.
+        self.pending = None
+        self.clear()
+
+    def clear(self):
+        self.signatures = {}
+        self.buckets = defaultdict(set)
+
+    def _bands(self, minhash):
+        for band in range(BANDS):
+            start = band * ROWS_PER_BAND
+            yield band, minhash[start:start + ROWS_PER_BAND].tobytes()
+
+    def add(self, ad_id, author_id, minhash):
+        if self.pending is not None:
+            self.pending.append(("add", ad_id, author_id, minhash))
+        self._discard(ad_id)
+        self.signatures[ad_id] = (author_id, minhash)
+        for key in self._bands(minhash):
+            self.buckets[key].add(ad_id)
+
+    def remove(self, ad_id):
+        if self.pending is not None:
+            self.pending.append(("remove", ad_id))
+        self._discard(ad_id)
+
+    def _discard(self, ad_id):
+        entry = self.signatures.pop(ad_id, None)
+        if entry is None:
+            return
+        for key in self._bands(entry[1]):
+            self.buckets[key].discard(ad_id)
+            if not self.buckets[key]:
+                del self.buckets[key]
+
+    def find_duplicate(self, minhash, author_id, exclude_id=None):
+        candidates = set()
+        for key in self._bands(minhash):
+            candidates |= self.buckets.get(key, set())
+        candidates.discard(exclude_id)
+        best_id, best_similarity = None, DUPLICATE_THRESHOLD
+        for ad_id in candidates:
+            candidate_author_id, candidate = self.signatures[ad_id]
+            if DUPLICATE_SCOPE == "author" and (
+                    candidate_author_id != author_id):
+                continue
+            score = similarity(minhash, candidate)
+            if score >= best_similarity:
+                best_id, best_similarity = ad_id, score
+        return best_id
+
+    async def load(self, session):
+        # Built aside and swapped in, so lookups made while the rows
+        # stream in still see the previous index. Writes this worker makes
+        # meanwhile may be missing from the stream and are replayed.
+        self.pending = []
+        try:
+            ads = await session.stream(
+                select(
+                    Advertisement.id, Advertisement.author_id,
+                    Advertisement.minhash, Advertisement.title,
+                    Advertisement.description
+                ).filter(
+                    Advertisement.archived == false()
+                ).execution_options(yield_per=1000)
+            )
+            index = DuplicateIndex()
+            async for ad in ads:
+                if ad.minhash is not None:
+                    minhash = np.frombuffer(ad.minhash, dtype=np.uint32)
+                else:
+                    minhash = signature(ad.title, ad.description)
+                index.add(ad.id, ad.author_id, minhash)
+            for method, *args in self.pending:
+                getattr(index, method)(*args)
+            self.signatures, self.buckets = index.signatures, index.buckets
+        finally:
+            self.pending = None
+
+
+duplicate_index = DuplicateIndex()
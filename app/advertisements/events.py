@@ -0,0 +1,61 @@
+import asyncio
+from collections import defaultdict
+
+# Events a client may lag behind before the oldest ones are dropped.
+SUBSCRIBER_QUEUE_SIZE = 100
+# A client that lost this many events in total is disconnected.
+SUBSCRIBER_MAX_DROPPED = 1000
+
+
+class Subscription:
+    def __init__(self, category_id=None, type=None,
+                 maxsize=SUBSCRIBER_QUEUE_SIZE):
+        self.category_id = category_id
+        self.type = type
+        self.queue = asyncio.Queue(maxsize)
+        self.dropped = 0
+        self.closed = False
+
+    def push(self, event):
+        if self.queue.full():
+            self.queue.get_nowait()
+            self.dropped += 1
+            if self.dropped > SUBSCRIBER_MAX_DROPPED:
+                self.closed = True
+        self.queue.put_nowait(event)
+
+
+class AdBroker:
+    """Per-worker pub/sub of ad events, fanned out by category.
+
+    Publishing never waits on a subscriber: a slow client loses its
+    oldest events and is closed once it has lost too many.
+    """
+
+    def __init__(self):
+        self.subscriptions = defaultdict(set)
+
+    def subscribe(self, category_id=None, type=None):
+        subscription = Subscription(category_id, type)
+        self.subscriptions[category_id].add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        subscriptions = self.subscriptions.get(subscription.category_id)
+        if subscriptions is None:
+            return
+        subscriptions.discard(subscription)
+        if not subscriptions:
+            del self.subscriptions[subscription.category_id]
+
+    def publish(self, event):
+        for category_id in {None, event.get("category_id")}:
+            for subscription in list(self.subscriptions.get(category_id, ())):
+                if subscription.type not in (None, event.get("type")):
+                    continue
+                subscription.push(event)
+                if subscription.closed:
+                    self.unsubscribe(subscription)
+
+
+ad_broker = AdBroker()
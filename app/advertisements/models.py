@@ -1,10 +1,12 @@
 import datetime
+import uuid
 
 from sqlalchemy import (
-    Boolean, Column, ForeignKey, Integer, String, TIMESTAMP
+    JSON, BigInteger, Boolean, Column, ForeignKey, Index, Integer,
+    LargeBinary, String, TIMESTAMP
 )
 from sqlalchemy.ext.declarative import DeclarativeMeta, declarative_base
-from sqlalchemy.orm import relationship
+from sqlalchemy.orm import deferred, relationship
 
 Base: DeclarativeMeta = declarative_base()
 
@@ -35,20 +37,62 @@ class Advertisement(Base):
     type = Column(String)
     author_id = Column(Integer,  ForeignKey("user.id"))
     description = Column(String)
-    pub_date = Column(TIMESTAMP, default=datetime.datetime.utcnow)
+    pub_date = Column(
+        TIMESTAMP, default=datetime.datetime.utcnow, nullable=False
+    )
     price = Column(Integer)
     group_id = Column(Integer, ForeignKey("group.id"))
     category_id = Column(Integer, ForeignKey("category.id"))
     is_active = Column(Boolean)
-    photos = relationship("Photo", back_populates="advertisement")
+    # Partition key: archived ads live in the cold partitions.
+    archived = Column(Boolean, default=False, nullable=False)
+    # MinHash of title+description, see advertisements/dedup.py. Deferred
+    # so ORM reads never load it and the raw bytes stay out of responses;
+    # raiseload turns an accidental lazy load into an error.
+    minhash = deferred(Column(LargeBinary), raiseload=True)
+    duplicate_of_id = Column(Integer)
+    photos = relationship(
+        "Photo",
+        primaryjoin="foreign(Photo.advertisement_id) == Advertisement.id",
+        back_populates="advertisement"
+    )
+
+
+# Serves the group feed: newest first, id breaks ties for keyset pagination.
+Index(
+    "ix_advertisement_group_id_pub_date_id",
+    Advertisement.group_id,
+    Advertisement.pub_date.desc(),
+    Advertisement.id,
+)
+
+
+class PriceBucket(Base):
+    # Incremental price histogram, see advertisements/price_stats.py.
+    __tablename__ = "price_bucket"
+
+    category_id = Column(
+        Integer, ForeignKey("category.id"), primary_key=True
+    )
+    type = Column(String, primary_key=True)
+    bucket = Column(Integer, primary_key=True)
+    count = Column(Integer, default=0, nullable=False)
+    sum = Column(BigInteger, default=0, nullable=False)
+    min = Column(Integer)
+    max = Column(Integer)
 
 
 class Photo(Base):
     __tablename__ = 'photo'
     id = Column(Integer, primary_key=True, index=True)
     url = Column(String)
-    advertisement_id = Column(Integer, ForeignKey('advertisement.id'))
-    advertisement = relationship("Advertisement", back_populates="photos")
+    advertisement_id = Column(Integer, index=True)
+    archived = Column(Boolean, default=False, nullable=False)
+    advertisement = relationship(
+        "Advertisement",
+        primaryjoin="foreign(Photo.advertisement_id) == Advertisement.id",
+        back_populates="photos"
+    )
 
 
 class Recall(Base):
@@ -56,7 +100,8 @@ class Recall(Base):
 
     id = Column(Integer, primary_key=True)
     author_id = Column(Integer,  ForeignKey("user.id"))
-    advertisement_id = Column(Integer, ForeignKey("advertisement.id"))
+    advertisement_id = Column(Integer, index=True)
+    archived = Column(Boolean, default=False, nullable=False)
     text = Column(String)
 
 
@@ -65,5 +110,23 @@ class Complaint(Base):
 
     id = Column(Integer, primary_key=True)
     author_id = Column(Integer,  ForeignKey("user.id"))
-    advertisement_id = Column(Integer, ForeignKey("advertisement.id"))
+    advertisement_id = Column(Integer, index=True)
+    archived = Column(Boolean, default=False, nullable=False)
     text = Column(String)
+
+
+class OutboxEvent(Base):
+    # Written in the transaction of the change it describes, drained and
+    # deleted by the relay in advertisements/outbox.py.
+    __tablename__ = "outbox"
+
+    id = Column(BigInteger, primary_key=True)
+    idempotency_key = Column(
+        String, unique=True, nullable=False,
+        default=lambda: uuid.uuid4().hex
+    )
+    aggregate = Column(String, nullable=False)
+    aggregate_id = Column(Integer)
+    event = Column(String, nullable=False)
+    payload = Column(JSON)
+    created_at = Column(TIMESTAMP, default=datetime.datetime.utcnow)
@@ -0,0 +1,121 @@
+"""Transactional outbox for ad, recall and complaint writes.
+
+Routes call ``emit`` before committing, so an event exists if and only if
+its change was committed. ``run_relay`` drains the table in batches with
+``FOR UPDATE SKIP LOCKED`` (any number of workers can run it), hands each
+batch to every sink and deletes it only after all sinks succeeded.
+Delivery is at-least-once: consumers deduplicate on ``idempotency_key``.
+"""
+import asyncio
+import json
+import logging
+
+import httpx
+from sqlalchemy import delete, insert, select
+
+from database import async_session_maker
+from .models import OutboxEvent
+
+OUTBOX_BATCH_SIZE = 100
+OUTBOX_POLL_INTERVAL = 1.0
+OUTBOX_FILE = "outbox_events.jsonl"
+
+logger = logging.getLogger(__name__)
+
+
+async def emit(session, aggregate, aggregate_id, event, payload=None):
+    await session.execute(insert(OutboxEvent).values(
+        aggregate=aggregate,
+        aggregate_id=aggregate_id,
+        event=event,
+        payload=payload
+    ))
+
+
+def serialize(event):
+    return {
+        "idempotency_key": event.idempotency_key,
+        "aggregate": event.aggregate,
+        "aggregate_id": event.aggregate_id,
+        "event": event.event,
+        "payload": event.payload,
+        "created_at": event.created_at.isoformat(),
+    }
+
+
+class FileSink:
+    """Appends events as JSON lines to a local file."""
+
+    def __init__(self, path=OUTBOX_FILE):
+        self.path = path
+
+    def _write(self, batch):
+        with open(self.path, "a") as file:
+            for event in batch:
+                file.write(json.dumps(event) + "\n")
+            file.flush()
+
+    async def deliver(self, batch):
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, self._write, batch)
+
+
+class WebhookSink:
+    """POSTs each batch as a JSON array to an HTTP endpoint."""
+
+    def __init__(self, url, timeout=10.0):
+        self.url = url
+        self.timeout = timeout
+
+    async def deliver(self, batch):
+        async with httpx.AsyncClient(timeout=self.timeout) as client:
+            response = await client.post(self.url, json=batch)
+            response.raise_for_status()
+
+
+class HandlerSink:
+    """Calls an in-process coroutine function with every event."""
+
+    def __init__(self, handler):
+        self.handler = handler
+
+    async def deliver(self, batch):
+        for event in batch:
+            await self.handler(event)
+
+
+OUTBOX_SINKS = [FileSink()]
+
+
+async def relay_batch(sinks, batch_size=OUTBOX_BATCH_SIZE):
+    async with async_session_maker() as session:
+        events = await session.execute(
+            select(OutboxEvent).order_by(OutboxEvent.id).limit(
+                batch_size
+            ).with_for_update(skip_locked=True)
+        )
+        events = events.scalars().all()
+        if not events:
+            return 0
+        batch = [serialize(event) for event in events]
+        for sink in sinks:
+            await sink.deliver(batch)
+        await session.execute(
+            delete(OutboxEvent).where(
+                OutboxEvent.id.in_([event.id for event in events])
+            ).execution_options(synchronize_session=False)
+        )
+        await session.commit()
+        return len(batch)
+
+
+async def run_relay(sinks=OUTBOX_SINKS, batch_size=OUTBOX_BATCH_SIZE,
+                    poll_interval=OUTBOX_POLL_INTERVAL):
+    while True:
+        try:
+            delivered = await relay_batch(sinks, batch_size)
+        except Exception:
+            logger.exception("Outbox delivery failed, retrying")
+            delivered = 0
+        if delivered < batch_size:
+            await asyncio.sleep(poll_interval)
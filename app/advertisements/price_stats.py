@@ -0,0 +1,170 @@
+"""Price distribution per (category, type) kept in fixed log buckets.
+
+Buckets are mergeable counters, so ad writes update them in the same
+transaction and reads never scan advertisement. Bucket min/max only grow,
+so deletes and the archiver make them drift; a periodic rebuild from the
+app directory puts them back in line:
+
+    python -m advertisements.price_stats
+"""
+import asyncio
+import math
+from collections import defaultdict
+
+from sqlalchemy import delete, false, func, insert, select, text, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+
+from database import async_session_maker
+from .models import Advertisement, PriceBucket
+
+# Each bucket is GROWTH times wider than the previous one, which bounds
+# the relative error of percentiles to about 10%.
+GROWTH = 1.1
+PERCENTILES = (25, 50, 75, 90, 99)
+REBUILD_BATCH_SIZE = 1000
+
+
+def bucket(price):
+    if price is None or price < 1:
+        return 0
+    return math.floor(math.log(price) / math.log(GROWTH)) + 1
+
+
+def bucket_bounds(index):
+    if index == 0:
+        return 0.0, 1.0
+    return GROWTH ** (index - 1), GROWTH ** index
+
+
+def _type(type):
+    return getattr(type, "value", type)
+
+
+async def record(session, category_id, type, price, delta):
+    if price is None or category_id is None or type is None:
+        return
+    key = {
+        "category_id": category_id,
+        "type": _type(type),
+        "bucket": bucket(price),
+    }
+    if delta > 0:
+        statement = pg_insert(PriceBucket).values(
+            count=delta, sum=price * delta, min=price, max=price, **key
+        )
+        excluded = statement.excluded
+        await session.execute(statement.on_conflict_do_update(
+            index_elements=list(key),
+            set_={
+                "count": PriceBucket.count + excluded.count,
+                "sum": PriceBucket.sum + excluded.sum,
+                "min": func.least(PriceBucket.min, excluded.min),
+                "max": func.greatest(PriceBucket.max, excluded.max),
+            }
+        ))
+    else:
+        await session.execute(
+            update(PriceBucket).filter_by(**key).values(
+                count=PriceBucket.count + delta,
+                sum=PriceBucket.sum + price * delta
+            )
+        )
+
+
+def _value_at(buckets, rank):
+    seen = 0
+    for row in buckets:
+        if seen + row["count"] >= rank:
+            lower, upper = bucket_bounds(row["bucket"])
+            lower, upper = max(lower, row["min"]), min(upper, row["max"])
+            share = (rank - seen) / row["count"]
+            return lower + (upper - lower) * share
+        seen += row["count"]
+    return buckets[-1]["max"]
+
+
+def summarize(rows):
+    merged = {}
+    for row in rows:
+        if row.count <= 0:
+            continue
+        entry = merged.setdefault(row.bucket, {
+            "bucket": row.bucket, "count": 0, "sum": 0,
+            "min": row.min, "max": row.max,
+        })
+        entry["count"] += row.count
+        entry["sum"] += row.sum
+        entry["min"] = min(entry["min"], row.min)
+        entry["max"] = max(entry["max"], row.max)
+    buckets = [merged[index] for index in sorted(merged)]
+    count = sum(row["count"] for row in buckets)
+    if not count:
+        return {"count": 0, "histogram": []}
+    return {
+        "count": count,
+        "min": buckets[0]["min"],
+        "max": buckets[-1]["max"],
+        "mean": sum(row["sum"] for row in buckets) / count,
+        "percentiles": {
+            f"p{percentile}": _value_at(buckets, count * percentile / 100)
+            for percentile in PERCENTILES
+        },
+        "histogram": [
+            {
+                "lower": bucket_bounds(row["bucket"])[0],
+                "upper": bucket_bounds(row["bucket"])[1],
+                "count": row["count"],
+            }
+            for row in buckets
+        ],
+    }
+
+
+async def rebuild():
+    async with async_session_maker() as session:
+        # Writers block on the lock until the rebuild commits and then
+        # apply their own delta on top, so nothing is counted twice.
+        await session.execute(
+            text("LOCK TABLE price_bucket IN EXCLUSIVE MODE")
+        )
+        totals = defaultdict(lambda: {
+            "count": 0, "sum": 0, "min": None, "max": None
+        })
+        ads = await session.stream(
+            select(
+                Advertisement.category_id, Advertisement.type,
+                Advertisement.price
+            ).filter(
+                Advertisement.archived == false(),
+                Advertisement.category_id.is_not(None),
+                Advertisement.type.is_not(None),
+                Advertisement.price.is_not(None)
+            ).execution_options(yield_per=REBUILD_BATCH_SIZE)
+        )
+        async for category_id, type, price in ads:
+            entry = totals[(category_id, type, bucket(price))]
+            entry["count"] += 1
+            entry["sum"] += price
+            entry["min"] = price if entry["min"] is None else min(
+                entry["min"], price
+            )
+            entry["max"] = price if entry["max"] is None else max(
+                entry["max"], price
+            )
+        await session.execute(delete(PriceBucket))
+        if totals:
+            await session.execute(insert(PriceBucket), [
+                {
+                    "category_id": category_id,
+                    "type": type,
+                    "bucket": index,
+                    **entry
+                }
+                for (category_id, type, index), entry in totals.items()
+            ])
+        await session.commit()
+    return len(totals)
+
+
+if __name__ == "__main__":
+    print(f"Rebuilt {asyncio.run(rebuild())} price buckets")
@@ -0,0 +1,124 @@
+"""Statements of the hot routes, built once per process.
+
+Fixed-shape statements are module level templates with named bind
+parameters, executed as ``session.execute(statement, {...})``. Statements
+whose shape depends on the request are ``lambda_stmt`` chains: SQLAlchemy
+caches them by the code of the lambdas and only extracts the closure
+values on each call, so the Python construction cost is paid once.
+"""
+from sqlalchemy import (
+    Boolean, and_, bindparam, delete, false, lambda_stmt, or_, select
+)
+from sqlalchemy.orm import selectinload
+
+from .cache import FEED_CACHE_PAGE_SIZE
+from .models import (
+    Advertisement, Category, Complaint, Group, Photo, PriceBucket, Recall
+)
+
+
+def _owned_delete(model, *returning):
+    # Ownership check and delete in one round trip: the row goes away only
+    # if it belongs to the user or the user is an admin.
+    return delete(model).where(
+        model.id == bindparam("id"),
+        or_(
+            model.author_id == bindparam("user_id"),
+            bindparam("is_admin", type_=Boolean)
+        )
+    ).returning(model.id, *returning)
+
+
+get_categories = select(Category)
+
+get_group = select(Group).filter(Group.id == bindparam("id")).limit(1)
+
+get_ad = select(Advertisement).options(
+    selectinload(Advertisement.photos)
+).filter(Advertisement.id == bindparam("id")).limit(1)
+
+get_ad_for_update = select(Advertisement).where(
+    Advertisement.id == bindparam("id")
+)
+
+get_recalls = select(Recall).filter(
+    Recall.advertisement_id == bindparam("ad_id")
+).limit(10)
+
+delete_ad = _owned_delete(
+    Advertisement, Advertisement.group_id, Advertisement.category_id,
+    Advertisement.type, Advertisement.price, Advertisement.archived
+)
+# Photos, recalls and complaints have no foreign key to the partitioned
+# advertisement table, so they are deleted together with their ad.
+delete_ad_children = [
+    delete(model).where(model.advertisement_id == bindparam("id"))
+    for model in (Photo, Recall, Complaint)
+]
+delete_recall = _owned_delete(Recall)
+delete_complaint = _owned_delete(Complaint)
+
+
+def ads_page(category_id, type, sort_by_category, offset, limit):
+    statement = lambda_stmt(
+        lambda: select(Advertisement).options(
+            selectinload(Advertisement.photos)
+        ).filter(Advertisement.archived == false())
+    )
+    if category_id is not None:
+        statement += lambda s: s.filter(
+            Advertisement.category_id == category_id
+        )
+    if type is not None:
+        statement += lambda s: s.filter(Advertisement.type == type)
+    if sort_by_category:
+        statement += lambda s: s.order_by(Advertisement.category_id)
+    statement += lambda s: s.offset(offset).limit(limit)
+    return statement
+
+
+def group_feed(group_id, limit, last_pub_date=None, last_id=None):
+    statement = lambda_stmt(
+        lambda: select(Advertisement).options(
+            selectinload(Advertisement.photos)
+        ).filter(
+            Advertisement.group_id == group_id,
+            Advertisement.archived == false()
+        ).order_by(Advertisement.pub_date.desc(), Advertisement.id)
+    )
+    if last_pub_date is not None and last_id is not None:
+        statement += lambda s: s.filter(
+            Advertisement.pub_date <= last_pub_date,
+            or_(
+                Advertisement.pub_date < last_pub_date,
+                and_(
+                    Advertisement.pub_date == last_pub_date,
+                    Advertisement.id > last_id
+                )
+            )
+        )
+    statement += lambda s: s.limit(limit)
+    return statement
+
+
+def price_buckets(category_id, type):
+    statement = lambda_stmt(
+        lambda: select(PriceBucket).filter(
+            PriceBucket.category_id == category_id
+        )
+    )
+    if type is not None:
+        statement += lambda s: s.filter(PriceBucket.type == type)
+    return statement
+
+
+def hot_statements():
+    # Same shapes as the most frequent route queries; the bound values do
+    # not matter, only the statement structure is cached.
+    return [
+        (ads_page(None, None, False, 0, 5), None),
+        (group_feed(0, FEED_CACHE_PAGE_SIZE), None),
+        (get_ad, {"id": 0}),
+        (get_group, {"id": 0}),
+        (get_categories, None),
+    ]
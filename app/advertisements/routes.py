@@ -1,29 +1,35 @@
+import asyncio
+import json
+from datetime import datetime
 from typing import List
 
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, Request
 from fastapi.exceptions import HTTPException
-from fastapi_users import FastAPIUsers
-from sqlalchemy import insert, select, delete, update
+from fastapi.responses import StreamingResponse
+from sqlalchemy import false, insert, select, delete, update
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import selectinload
 
 from database import get_async_session
+from .events import ad_broker
+from .dedup import DUPLICATE_ACTION, duplicate_index, signature
+from .cache import FEED_CACHE_PAGE_SIZE, group_feed_cache
+from . import queries
+from .outbox import emit
 from .models import Advertisement, Category, Group, Photo, Recall, Complaint
+from .price_stats import record, summarize
+from .similarity import similarity_index
 from .schemas import (
     CategoryCreate, CategoryRead, GroupCreate, GroupRead, ComplaintRead,
-    RecallRead, RecallCreate, ComplaintCreate, AdvertisementCreate
+    RecallRead, RecallCreate, ComplaintCreate, AdvertisementCreate,
+    PriceStatsRead
 )
-from users.auth import auth_backend
-from users.manager import get_user_manager
+from searches.index import saved_search_index
+from searches.models import Notification
+from users.auth import current_user
 from users.models import User
 
 
-fastapi_users = FastAPIUsers[User, int](
-    get_user_manager,
-    [auth_backend],
-)
-current_user = fastapi_users.current_user()
-
 router_categories = APIRouter(
     tags=['categories'],
     prefix='/categories',
@@ -32,7 +38,7 @@ router_categories = APIRouter(
 
 @router_categories.get('/', response_model=List[CategoryRead])
 async def get_categories(session: AsyncSession = Depends(get_async_session)):
-    categories = await session.execute(select(Category))
+    categories = await session.execute(queries.get_categories)
     category_list = categories.scalars().all()
     return category_list
 
@@ -51,6 +57,16 @@ async def create_category(
     return {"status": "success"}
 
 
+@router_categories.get('/{id}/price-stats/', response_model=PriceStatsRead)
+async def get_price_stats(
+    id: int,
+    session: AsyncSession = Depends(get_async_session),
+    type: str = None
+):
+    buckets = await session.execute(queries.price_buckets(id, type))
+    return summarize(buckets.scalars().all())
+
+
 router_groups = APIRouter(
     tags=['groups'],
     prefix='/groups',
@@ -69,15 +85,39 @@ async def get_group(
     id: int,
     session: AsyncSession = Depends(get_async_session)
 ):
-    group = await session.execute(
-        select(Group).filter(Group.id == id).limit(1)
-    )
+    group = await session.execute(queries.get_group, {"id": id})
     group = group.scalar_one_or_none()
     if group is None:
         raise HTTPException(status_code=404, detail="This group is not exists")
     return group
 
 
+@router_groups.get('/{id}/ads/')
+async def get_group_ads(
+    id: int,
+    session: AsyncSession = Depends(get_async_session),
+    page_size: int = 5,
+    last_pub_date: datetime = None,
+    last_id: int = None
+):
+    first_page = last_pub_date is None or last_id is None
+    if first_page:
+        ads_list = group_feed_cache.get(id, page_size)
+        if ads_list is not None:
+            return ads_list
+
+    limit = page_size
+    if first_page:
+        limit = max(page_size, FEED_CACHE_PAGE_SIZE)
+    ads = await session.execute(
+        queries.group_feed(id, limit, last_pub_date, last_id)
+    )
+    ads_list = ads.scalars().all()
+    if first_page:
+        group_feed_cache.set(id, ads_list)
+    return ads_list[:page_size]
+
+
 @router_groups.post('/')
 async def create_group(
     request: GroupCreate,
@@ -124,22 +164,66 @@ async def get_ads(
     type: str = None,
     sort_by_category: bool = False
 ):
-    query = select(Advertisement).options(selectinload(Advertisement.photos))
+    offset = (page - 1) * page_size
+    ads = await session.execute(queries.ads_page(
+        category_id, type, sort_by_category, offset, page_size
+    ))
+    ads_list = ads.scalars().all()
+    return ads_list
 
-    if category_id is not None:
-        query = query.filter(Advertisement.category_id == category_id)
-    if type is not None:
-        query = query.filter(Advertisement.type == type)
 
-    if sort_by_category:
-        query = query.order_by(Advertisement.category_id)
+STREAM_KEEPALIVE_INTERVAL = 15
+SIMILAR_OVERFETCH = 2
 
-    offset = (page - 1) * page_size
-    query = query.offset(offset).limit(page_size)
 
-    ads = await session.execute(query)
-    ads_list = ads.scalars().all()
-    return ads_list
+def ad_event(event, id, ad_data, photos_data):
+    return {
+        "event": event,
+        "id": id,
+        "title": ad_data["title"],
+        "type": ad_data["type"],
+        "description": ad_data["description"],
+        "price": ad_data["price"],
+        "group_id": ad_data.get("group_id"),
+        "category_id": ad_data["category_id"],
+        "author_id": ad_data["author_id"],
+        "photos": [photo["url"] for photo in photos_data],
+    }
+
+
+@router_ads.get('/stream/')
+async def stream_ads(
+    request: Request,
+    category_id: int = None,
+    type: str = None
+):
+    subscription = ad_broker.subscribe(category_id, type)
+
+    async def event_stream():
+        try:
+            while not subscription.closed:
+                try:
+                    event = await asyncio.wait_for(
+                        subscription.queue.get(), STREAM_KEEPALIVE_INTERVAL
+                    )
+                except asyncio.TimeoutError:
+                    if await request.is_disconnected():
+                        break
+                    yield ": keepalive\n\n"
+                    continue
+                yield (
+                    f"event: {event['event']}\n"
+                    f"id: {event['id']}\n"
+                    f"data: {json.dumps(event)}\n\n"
+                )
+        finally:
+            ad_broker.unsubscribe(subscription)
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache"}
+    )
 
 
 @router_ads.post('/')
@@ -151,6 +235,16 @@ async def create_advertisement(
     ad_data = request.dict()
     photos_data = ad_data.pop('photos')
     ad_data["author_id"] = user.id
+    minhash = signature(ad_data["title"], ad_data["description"])
+    duplicate_of_id = duplicate_index.find_duplicate(minhash, user.id)
+    if duplicate_of_id is not None:
+        if DUPLICATE_ACTION == "reject":
+            raise HTTPException(
+                status_code=409,
+                detail=f"This advertisement duplicates {duplicate_of_id}"
+            )
+        ad_data["duplicate_of_id"] = duplicate_of_id
+    ad_data["minhash"] = minhash.tobytes()
     ad = insert(Advertisement).values(**ad_data).returning(Advertisement.id)
     result = await session.execute(ad)
     advertisement_id = result.scalar()
@@ -162,7 +256,28 @@ async def create_advertisement(
         result = await session.execute(photo)
         photos_objects.append(result.scalar())
 
+    await record(
+        session, ad_data["category_id"], ad_data["type"], ad_data["price"], 1
+    )
+
+    matches = saved_search_index.match(ad_data)
+    if matches:
+        await session.execute(insert(Notification), [
+            {
+                "user_id": search.user_id,
+                "saved_search_id": search.id,
+                "advertisement_id": advertisement_id
+            }
+            for search in matches
+        ])
+
+    event = ad_event("created", advertisement_id, ad_data, photos_data)
+    await emit(session, "advertisement", advertisement_id, "created", event)
     await session.commit()
+    group_feed_cache.invalidate(ad_data["group_id"])
+    similarity_index.upsert(advertisement_id, ad_data)
+    duplicate_index.add(advertisement_id, user.id, minhash)
+    ad_broker.publish(event)
     return {
         "status": "success",
         "advertisement": advertisement_id,
@@ -175,11 +290,7 @@ async def get_ad(
     id: int,
     session: AsyncSession = Depends(get_async_session)
 ):
-    advertisement = await session.execute(
-        select(Advertisement).options(
-            selectinload(Advertisement.photos)
-        ).filter(Advertisement.id == id).limit(1)
-    )
+    advertisement = await session.execute(queries.get_ad, {"id": id})
     advertisement = advertisement.scalar_one_or_none()
     if advertisement is None:
         raise HTTPException(
@@ -188,6 +299,45 @@ async def get_ad(
     return advertisement
 
 
+@router_ads.get('/{id}/similar/')
+async def get_similar_ads(
+    id: int,
+    session: AsyncSession = Depends(get_async_session),
+    limit: int = 5
+):
+    ad = await session.execute(
+        select(
+            Advertisement.title, Advertisement.description,
+            Advertisement.category_id, Advertisement.price
+        ).filter(Advertisement.id == id)
+    )
+    ad = ad.mappings().one_or_none()
+    if ad is None:
+        raise HTTPException(
+            status_code=404, detail="This advertisement is not exists"
+        )
+    # Ads deleted or archived through other workers are still in the index
+    # until the next rebuild; asking for more keeps `limit` results after
+    # the database filter below.
+    similar_ids = similarity_index.similar(
+        id, limit * SIMILAR_OVERFETCH, ad
+    )
+    if not similar_ids:
+        return []
+    ads = await session.execute(
+        select(Advertisement).options(
+            selectinload(Advertisement.photos)
+        ).filter(
+            Advertisement.id.in_(similar_ids),
+            Advertisement.archived == false()
+        )
+    )
+    ads_by_id = {ad.id: ad for ad in ads.scalars().all()}
+    return [
+        ads_by_id[ad_id] for ad_id in similar_ids if ad_id in ads_by_id
+    ][:limit]
+
+
 @router_ads.patch('/{id}/')
 async def update_ad(
     id: int,
@@ -196,7 +346,7 @@ async def update_ad(
     session: AsyncSession = Depends(get_async_session)
 ):
     advertisement = await session.execute(
-        select(Advertisement).where(Advertisement.id == id)
+        queries.get_ad_for_update, {"id": id}
     )
     advertisement = advertisement.scalar()
 
@@ -207,21 +357,45 @@ async def update_ad(
             status_code=403,
             detail="Only the author can update the advertisement"
         )
+    old_group_id = advertisement.group_id
+    # Archived ads are not counted in the price statistics.
+    if not advertisement.archived:
+        await record(
+            session, advertisement.category_id, advertisement.type,
+            advertisement.price, -1
+        )
     update_data = request.dict(exclude_unset=True)
     photos_data = update_data.pop('photos')
+    minhash = signature(update_data["title"], update_data["description"])
+    update_data["minhash"] = minhash.tobytes()
     await session.execute(update(Advertisement).where(
         Advertisement.id == id
     ).values(update_data))
+    if not advertisement.archived:
+        await record(
+            session, update_data["category_id"], update_data["type"],
+            update_data["price"], 1
+        )
     photos_objects = []
     await session.execute(
         delete(Photo).where(Photo.advertisement_id == id)
     )
     for photo_data in photos_data:
         photo_data["advertisement_id"] = id
+        # Photos follow their ad into the hot or archive partition.
+        photo_data["archived"] = advertisement.archived
         photo = insert(Photo).values(**photo_data)
         result = await session.execute(photo)
         photos_objects.append(result.scalar())
+    update_data["author_id"] = advertisement.author_id
+    event = ad_event("updated", id, update_data, photos_data)
+    await emit(session, "advertisement", id, "updated", event)
     await session.commit()
+    group_feed_cache.invalidate(old_group_id, update_data.get("group_id"))
+    if not advertisement.archived:
+        similarity_index.upsert(id, update_data)
+        duplicate_index.add(id, advertisement.author_id, minhash)
+    ad_broker.publish(event)
     return {"status": "success"}
 
 
@@ -232,19 +406,33 @@ async def delete_ad(
     session: AsyncSession = Depends(get_async_session)
 ):
     advertisement = await session.execute(
-        select(Advertisement).where(Advertisement.id == id)
+        queries.delete_ad,
+        {"id": id, "user_id": user.id, "is_admin": user.is_superuser},
+        execution_options={"synchronize_session": False}
     )
-    advertisement = advertisement.scalar()
-    if not (user.is_superuser or (
-        advertisement and advertisement.author_id == user.id)
-    ):
+    advertisement = advertisement.one_or_none()
+    if advertisement is None and not user.is_superuser:
         raise HTTPException(
             status_code=403,
             detail="Only author or admin can delete theadvertisement"
         )
-    advertisement = delete(Advertisement).where(Advertisement.id == id)
-    await session.execute(advertisement)
+    if advertisement is not None:
+        for statement in queries.delete_ad_children:
+            await session.execute(
+                statement, {"id": id},
+                execution_options={"synchronize_session": False}
+            )
+        if not advertisement.archived:
+            await record(
+                session, advertisement.category_id, advertisement.type,
+                advertisement.price, -1
+            )
+        await emit(session, "advertisement", id, "deleted")
     await session.commit()
+    if advertisement is not None:
+        group_feed_cache.invalidate(advertisement.group_id)
+        similarity_index.remove(id)
+    duplicate_index.remove(id)
     return {"status": "success"}
 
 
@@ -259,10 +447,8 @@ async def get_recalls(
     ad_id: int,
     session: AsyncSession = Depends(get_async_session)
 ):
-    recalls = await session.execute(
-        select(Recall).filter(Recall.advertisement_id == ad_id).limit(10)
-    )
-    recalls = recalls.scalar().all()
+    recalls = await session.execute(queries.get_recalls, {"ad_id": ad_id})
+    recalls = recalls.scalars().all()
     return recalls
 
 
@@ -276,8 +462,9 @@ async def create_recall(
     recall_data = request.dict()
     recall_data["author_id"] = user.id
     recall_data["advertisement_id"] = ad_id
-    recall = insert(Recall).values(**recall_data)
-    await session.execute(recall)
+    recall = insert(Recall).values(**recall_data).returning(Recall.id)
+    recall_id = (await session.execute(recall)).scalar()
+    await emit(session, "recall", recall_id, "created", recall_data)
     await session.commit()
     return {"status": "success"}
 
@@ -290,18 +477,20 @@ async def delete_recall(
     session: AsyncSession = Depends(get_async_session)
 ):
     recall = await session.execute(
-        select(Recall).where(Recall.id == id)
+        queries.delete_recall,
+        {"id": id, "user_id": user.id, "is_admin": user.is_superuser},
+        execution_options={"synchronize_session": False}
     )
-    recall = recall.scalar()
-    if not (user.is_superuser or (
-        recall and recall.author_id == user.id)
-    ):
+    recall = recall.one_or_none()
+    if recall is None and not user.is_superuser:
         raise HTTPException(
             status_code=403,
             detail="Only author or admin can delete recall"
         )
-    recall = delete(Recall).where(Recall.id == id)
-    await session.execute(recall)
+    if recall is not None:
+        await emit(
+            session, "recall", id, "deleted", {"advertisement_id": ad_id}
+        )
     await session.commit()
     return {"status": "success"}
 
@@ -326,7 +515,7 @@ async def get_complaints(
     complaints = await session.execute(
         select(Complaint).filter(Complaint.advertisement_id == ad_id).limit(10)
     )
-    complaints = complaints.scalar().all()
+    complaints = complaints.scalars().all()
     return complaints
 
 
@@ -340,8 +529,11 @@ async def create_complaint(
     complaint_data = request.dict()
     complaint_data["author_id"] = user.id
     complaint_data["advertisement_id"] = ad_id
-    complaint = insert(Complaint).values(**complaint_data)
-    await session.execute(complaint)
+    complaint = insert(Complaint).values(**complaint_data).returning(
+        Complaint.id
+    )
+    complaint_id = (await session.execute(complaint)).scalar()
+    await emit(session, "complaint", complaint_id, "created", complaint_data)
     await session.commit()
     return {"status": "success"}
 
@@ -354,17 +546,19 @@ async def delete_complaints(
     session: AsyncSession = Depends(get_async_session)
 ):
     complaint = await session.execute(
-        select(Complaint).where(Complaint.id == id)
+        queries.delete_complaint,
+        {"id": id, "user_id": user.id, "is_admin": user.is_superuser},
+        execution_options={"synchronize_session": False}
     )
-    complaint = complaint.scalar()
-    if not (user.is_superuser or (
-        complaint and complaint.author_id == user.id)
-    ):
+    complaint = complaint.one_or_none()
+    if complaint is None and not user.is_superuser:
         raise HTTPException(
             status_code=403,
             detail="Only author or admin can delete recall"
         )
-    complaint = delete(Complaint).where(Complaint.id == id)
-    await session.execute(complaint)
+    if complaint is not None:
+        await emit(
+            session, "complaint", id, "deleted", {"advertisement_id": ad_id}
+        )
     await session.commit()
     return {"status": "success"}
@@ -1,5 +1,5 @@
 from enum import Enum
-from typing import List, Optional
+from typing import Dict, List, Optional
 
 from pydantic import BaseModel
 
@@ -34,6 +34,21 @@ class GroupRead(BaseModel):
         orm_mode = True
 
 
+class PriceBucketRead(BaseModel):
+    lower: float
+    upper: float
+    count: int
+
+
+class PriceStatsRead(BaseModel):
+    count: int
+    min: Optional[int] = None
+    max: Optional[int] = None
+    mean: Optional[float] = None
+    percentiles: Dict[str, float] = {}
+    histogram: List[PriceBucketRead]
+
+
 class AdvertisementType(str, Enum):
     SELL = 'sell'
     BUY = 'buy'
@@ -0,0 +1,326 @@
+"""Hashed feature vectors of ads for the "similar ads" endpoint.
+
+Vectors live in a memory-mapped float32 matrix with a parallel id map. Only
+the rebuild writes them: each run builds a new version directory inside
+SIMILARITY_INDEX_DIR and repoints its "current" link, while app workers
+map the current version read-only and switch to a newer one on their own.
+Each worker keeps the ads it wrote since that version in a small in-memory
+delta; writes made through other workers show up after the next rebuild,
+so run it on a schedule from the app directory:
+
+    python -m advertisements.similarity
+"""
+import asyncio
+import datetime
+import math
+import os
+import re
+import shutil
+import time
+import zlib
+
+import numpy as np
+from sqlalchemy import false, select
+
+from database import async_session_maker
+from .models import Advertisement
+
+SIMILARITY_INDEX_DIR = "similarity_index"
+VECTOR_DIM = 512
+INITIAL_CAPACITY = 1024
+TITLE_WEIGHT = 2.0
+CATEGORY_WEIGHT = 1.5
+PRICE_WEIGHT = 1.0
+REBUILD_BATCH_SIZE = 1000
+# Workers look for a newer index version at most this often.
+SIMILARITY_RELOAD_INTERVAL = 30
+CURRENT_LINK = "current"
+VERSION_FORMAT = "%Y%m%dT%H%M%S%f"
+# Per-worker rows for ads written since the current version.
+DELTA_INITIAL_CAPACITY = 256
+
+WORD_RE = re.compile(r"\w+")
+
+
+def _bucket(feature):
+    # crc32 is stable across processes, unlike hash() on str.
+    digest = zlib.crc32(feature.encode())
+    return digest % VECTOR_DIM, 1.0 if digest & 0x80000000 else -1.0
+
+
+def vectorize(ad):
+    counts = {}
+    for weight, field in (
+        (TITLE_WEIGHT, ad.get("title")),
+        (1.0, ad.get("description")),
+    ):
+        for word in WORD_RE.findall((field or "").lower()):
+            counts[word] = counts.get(word, 0.0) + weight
+
+    vector = np.zeros(VECTOR_DIM, dtype=np.float32)
+    for word, count in counts.items():
+        column, sign = _bucket(word)
+        vector[column] += sign * (1.0 + math.log(count))
+    if ad.get("category_id") is not None:
+        column, sign = _bucket(f"category:{ad['category_id']}")
+        vector[column] += sign * CATEGORY_WEIGHT
+    if ad.get("price"):
+        band = round(math.log2(max(ad["price"], 1)) * 2)
+        column, sign = _bucket(f"price:{band}")
+        vector[column] += sign * PRICE_WEIGHT
+
+    norm = np.linalg.norm(vector)
+    if norm:
+        vector /= norm
+    return vector
+
+
+def _files(path):
+    return (
+        os.path.join(path, "vectors.f32"),
+        os.path.join(path, "ids.i64"),
+    )
+
+
+class SimilarityIndex:
+    """Current index version plus a per-worker delta for top-k queries.
+
+    Any number of workers can map the same version read-only; ``reload``
+    switches to the version the last rebuild pointed "current" at. Ads this
+    worker writes after that go to an in-memory delta (``upsert``) or are
+    tombstoned (``remove``), and queries score both together. Delta entries
+    older than a new version are dropped, since the rebuild read them from
+    the database.
+    """
+
+    def __init__(self, path=SIMILARITY_INDEX_DIR):
+        self.path = path
+        self.version = None
+        self.built_at = None
+        self.vectors = None
+        self.ids = None
+        self.rows = {}
+        self.checked_at = 0.0
+        self.delta_vectors = np.zeros(
+            (DELTA_INITIAL_CAPACITY, VECTOR_DIM), dtype=np.float32
+        )
+        self.delta_ids = np.full(DELTA_INITIAL_CAPACITY, -1, dtype=np.int64)
+        self.delta_rows = {}
+        self.delta_free_rows = []
+        self.delta_size = 0
+        # ad id -> when it was written or deleted here.
+        self.written_at = {}
+        self.deleted = set()
+
+    def _current(self):
+        link = os.path.join(self.path, CURRENT_LINK)
+        if not os.path.exists(link):
+            return None
+        return os.path.realpath(link)
+
+    def open(self):
+        self.checked_at = time.monotonic()
+        version = self._current()
+        if version is None or version == self.version:
+            return
+        vectors_file, ids_file = _files(version)
+        ids = np.memmap(ids_file, dtype=np.int64, mode="r")
+        vectors = np.memmap(
+            vectors_file, dtype=np.float32, mode="r",
+            shape=(len(ids), VECTOR_DIM)
+        )
+        used = np.flatnonzero(ids >= 0)
+        # Swapped in one go, so queries see either version but never a mix.
+        self.version, self.vectors, self.ids = version, vectors, ids
+        self.rows = dict(zip(ids[used].tolist(), used.tolist()))
+        self.built_at = datetime.datetime.strptime(
+            os.path.basename(version), VERSION_FORMAT
+        )
+        for ad_id, written_at in list(self.written_at.items()):
+            if written_at < self.built_at:
+                self._forget(ad_id)
+
+    def close(self):
+        self.version = self.built_at = self.vectors = self.ids = None
+        self.rows = {}
+
+    def reload(self):
+        if time.monotonic() - self.checked_at >= SIMILARITY_RELOAD_INTERVAL:
+            self.open()
+
+    def _forget(self, ad_id):
+        del self.written_at[ad_id]
+        self.deleted.discard(ad_id)
+        row = self.delta_rows.pop(ad_id, None)
+        if row is not None:
+            self.delta_vectors[row] = 0
+            self.delta_ids[row] = -1
+            self.delta_free_rows.append(row)
+
+    def _allocate(self):
+        if self.delta_free_rows:
+            return self.delta_free_rows.pop()
+        if self.delta_size == len(self.delta_ids):
+            capacity = len(self.delta_ids)
+            self.delta_vectors = np.concatenate(
+                (self.delta_vectors, np.zeros_like(self.delta_vectors))
+            )
+            self.delta_ids = np.concatenate(
+                (self.delta_ids, np.full(capacity, -1, dtype=np.int64))
+            )
+        self.delta_size += 1
+        return self.delta_size - 1
+
+    def upsert(self, ad_id, ad):
+        self.written_at[ad_id] = datetime.datetime.utcnow()
+        self.deleted.discard(ad_id)
+        row = self.delta_rows.get(ad_id)
+        if row is None:
+            row = self._allocate()
+            self.delta_rows[ad_id] = row
+            self.delta_ids[row] = ad_id
+        self.delta_vectors[row] = vectorize(ad)
+
+    def remove(self, ad_id):
+        if ad_id in self.delta_rows:
+            self._forget(ad_id)
+        self.written_at[ad_id] = datetime.datetime.utcnow()
+        self.deleted.add(ad_id)
+
+    def _top(self, vectors, ids, vector, k, skip_rows=()):
+        if not len(ids):
+            return []
+        scores = np.asarray(vectors @ vector)
+        scores[list(skip_rows)] = -np.inf
+        k = min(k, len(scores))
+        top = np.argpartition(-scores, k - 1)[:k]
+        return [
+            (float(scores[row]), int(ids[row])) for row in top
+            if scores[row] > 0
+        ]
+
+    def similar(self, ad_id, k, ad=None):
+        # Given the current ``ad`` fields, the query vector is built from
+        # them, so ads not indexed yet still get up to date results.
+        self.reload()
+        if k <= 0:
+            return []
+        if ad is not None:
+            vector = vectorize(ad)
+        elif ad_id in self.delta_rows:
+            vector = self.delta_vectors[self.delta_rows[ad_id]]
+        elif ad_id in self.rows and ad_id not in self.deleted:
+            vector = self.vectors[self.rows[ad_id]]
+        else:
+            return []
+        scored = self._top(
+            self.delta_vectors[:self.delta_size],
+            self.delta_ids[:self.delta_size], vector, k + 1
+        )
+        if self.vectors is not None:
+            # Rows of the version superseded or deleted here are skipped.
+            skip_rows = [
+                self.rows[skipped] for skipped in (*self.written_at, ad_id)
+                if skipped in self.rows
+            ]
+            scored += self._top(
+                self.vectors, self.ids, vector, k, skip_rows
+            )
+        scored.sort(reverse=True)
+        return [
+            found_id for _, found_id in scored if found_id != ad_id
+        ][:k]
+
+
+similarity_index = SimilarityIndex()
+
+
+class IndexBuilder:
+    """Appends vectors to a new version directory, used by ``rebuild``."""
+
+    def __init__(self, path):
+        self.path = path
+        self.size = 0
+        os.makedirs(path)
+        self._map(INITIAL_CAPACITY)
+        self.ids[:] = -1
+
+    def _map(self, capacity):
+        vectors_file, ids_file = _files(self.path)
+        for file_name, item_size in ((vectors_file, 4 * VECTOR_DIM),
+                                     (ids_file, 8)):
+            with open(file_name, "ab") as file:
+                file.truncate(capacity * item_size)
+        self.vectors = np.memmap(
+            vectors_file, dtype=np.float32, mode="r+",
+            shape=(capacity, VECTOR_DIM)
+        )
+        self.ids = np.memmap(ids_file, dtype=np.int64, mode="r+",
+                             shape=(capacity,))
+
+    def _flush(self):
+        self.vectors.flush()
+        self.ids.flush()
+        self.vectors = self.ids = None
+
+    def add(self, ad_id, ad):
+        if self.size == len(self.ids):
+            capacity = len(self.ids)
+            self._flush()
+            self._map(capacity * 2)
+            self.ids[capacity:] = -1
+        self.vectors[self.size] = vectorize(ad)
+        self.ids[self.size] = ad_id
+        self.size += 1
+
+    def close(self):
+        # Trimmed to the rows in use; an empty index keeps one free row
+        # because empty files can not be memory-mapped.
+        self._flush()
+        capacity = max(self.size, 1)
+        for file_name, item_size in zip(_files(self.path),
+                                        (4 * VECTOR_DIM, 8)):
+            with open(file_name, "r+b") as file:
+                file.truncate(capacity * item_size)
+        return self.size
+
+
+async def rebuild(path=SIMILARITY_INDEX_DIR):
+    # Named after the build start: ads written before it are read from
+    # the database, so workers drop their delta entries older than that.
+    version = datetime.datetime.utcnow().strftime(VERSION_FORMAT)
+    builder = IndexBuilder(os.path.join(path, version))
+    async with async_session_maker() as session:
+        ads = await session.stream(
+            select(
+                Advertisement.id, Advertisement.title,
+                Advertisement.description, Advertisement.category_id,
+                Advertisement.price
+            ).filter(Advertisement.archived == false()).execution_options(
+                yield_per=REBUILD_BATCH_SIZE
+            )
+        )
+        async for ad in ads.mappings():
+            builder.add(ad["id"], ad)
+    count = builder.close()
+    # The link is replaced atomically. Workers still mapping an older
+    # version keep reading it until they reload: unlinked files stay
+    # readable for as long as they are mapped.
+    link = os.path.join(path, CURRENT_LINK)
+    if os.path.lexists(link + ".new"):
+        os.remove(link + ".new")
+    os.symlink(version, link + ".new")
+    os.replace(link + ".new", link)
+    for name in os.listdir(path):
+        if name in (version, CURRENT_LINK):
+            continue
+        old = os.path.join(path, name)
+        if os.path.isdir(old) and not os.path.islink(old):
+            shutil.rmtree(old, ignore_errors=True)
+        else:
+            os.remove(old)
+    return count
+
+
+if __name__ == "__main__":
+    print(f"Indexed {asyncio.run(rebuild())} advertisements")
@@ -0,0 +1,82 @@
+"""Bytes saved against CPU spent by the response compressors.
+
+Builds get_ads-like JSON listings of several sizes and compresses each
+with every available encoder setting. Run from the app directory:
+
+    python -m benchmarks.compression --repeat 20
+"""
+import argparse
+import json
+import random
+import time
+import zlib
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+WORDS = (
+    "sell buy service bike car phone laptop sofa table new used cheap "
+    "good condition delivery pickup warranty original box city center"
+).split()
+
+
+def listing(size, seed=0):
+    rng = random.Random(seed)
+    return json.dumps([
+        {
+            "id": index,
+            "title": " ".join(rng.choices(WORDS, k=5)),
+            "type": rng.choice(["sell", "buy", "service"]),
+            "description": " ".join(rng.choices(WORDS, k=80)),
+            "price": rng.randint(100, 100000),
+            "category_id": rng.randint(1, 20),
+            "group_id": None,
+            "photos": [
+                {"url": f"https://cdn.example.com/ads/{index}/{photo}.jpg"}
+                for photo in range(rng.randint(0, 5))
+            ],
+        }
+        for index in range(size)
+    ]).encode()
+
+
+def encoders():
+    for level in (1, 6, 9):
+        yield f"gzip-{level}", lambda data, level=level: zlib.compress(
+            data, level
+        )
+    if brotli is not None:
+        for quality in (1, 4, 11):
+            yield f"br-{quality}", lambda data, quality=quality: (
+                brotli.compress(data, quality=quality)
+            )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--repeat", type=int, default=10)
+    args = parser.parse_args()
+
+    print(
+        f"{'payload':>9} {'encoder':>8} {'bytes':>9} {'saved':>7} "
+        f"{'cpu/op':>10} {'MB/s':>8}"
+    )
+    for size in (5, 50, 500):
+        data = listing(size)
+        for name, compress in encoders():
+            started = time.process_time()
+            for _ in range(args.repeat):
+                compressed = compress(data)
+            spent = (time.process_time() - started) / args.repeat
+            print(
+                f"{len(data):>9} {name:>8} {len(compressed):>9} "
+                f"{(1 - len(compressed) / len(data)) * 100:6.1f}% "
+                f"{spent * 1e3:8.2f}ms "
+                f"{len(data) / max(spent, 1e-9) / 1e6:8.1f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+"""Python overhead per request of building and executing route statements.
+
+Compares statements built inline on every call (how the routes used to do
+it) with the prebuilt ones from advertisements/queries.py. Both run
+against an empty in-memory SQLite database, so the numbers are dominated
+by statement construction, cache key generation and ORM result handling,
+not by the database. Run from the app directory:
+
+    python -m benchmarks.queries --iterations 5000
+"""
+import argparse
+import timeit
+
+from sqlalchemy import create_engine, delete, false, select
+from sqlalchemy.orm import Session, selectinload
+
+import main  # noqa: F401  registers every model on the metadata
+from advertisements import queries
+from advertisements.models import Advertisement, Base, Group, Recall
+
+
+def inline_statements(session):
+    return {
+        "get_ads": lambda: session.execute(
+            select(Advertisement).options(
+                selectinload(Advertisement.photos)
+            ).filter(Advertisement.archived == false()).filter(
+                Advertisement.category_id == 1
+            ).offset(0).limit(5)
+        ).scalars().all(),
+        "get_ad": lambda: session.execute(
+            select(Advertisement).options(
+                selectinload(Advertisement.photos)
+            ).filter(Advertisement.id == 1).limit(1)
+        ).scalar_one_or_none(),
+        "get_group": lambda: session.execute(
+            select(Group).filter(Group.id == 1).limit(1)
+        ).scalar_one_or_none(),
+        "get_recalls": lambda: session.execute(
+            select(Recall).filter(Recall.advertisement_id == 1).limit(10)
+        ).scalars().all(),
+        "delete_recall": lambda: (
+            session.execute(
+                select(Recall).where(Recall.id == 1)
+            ).scalar(),
+            session.execute(
+                delete(Recall).where(Recall.id == 1),
+                execution_options={"synchronize_session": False}
+            ),
+        ),
+    }
+
+
+def prebuilt_statements(session):
+    owner = {"id": 1, "user_id": 1, "is_admin": False}
+    return {
+        "get_ads": lambda: session.execute(
+            queries.ads_page(1, None, False, 0, 5)
+        ).scalars().all(),
+        "get_ad": lambda: session.execute(
+            queries.get_ad, {"id": 1}
+        ).scalar_one_or_none(),
+        "get_group": lambda: session.execute(
+            queries.get_group, {"id": 1}
+        ).scalar_one_or_none(),
+        "get_recalls": lambda: session.execute(
+            queries.get_recalls, {"ad_id": 1}
+        ).scalars().all(),
+        "delete_recall": lambda: session.execute(
+            queries.delete_recall, owner,
+            execution_options={"synchronize_session": False}
+        ).one_or_none(),
+    }
+
+
+def run():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--iterations", type=int, default=2000)
+    args = parser.parse_args()
+
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine)
+    with Session(engine) as session:
+        inline = inline_statements(session)
+        prebuilt = prebuilt_statements(session)
+        print(f"{'route':>14} {'inline':>10} {'prebuilt':>10} {'saved':>8}")
+        for name in inline:
+            timings = []
+            for run in (inline[name], prebuilt[name]):
+                run()
+                timings.append(
+                    timeit.timeit(run, number=args.iterations)
+                    / args.iterations * 1e6
+                )
+            print(
+                f"{name:>14} {timings[0]:8.1f}us {timings[1]:8.1f}us "
+                f"{(1 - timings[1] / timings[0]) * 100:7.1f}%"
+            )
+
+
+if __name__ == "__main__":
+    run()
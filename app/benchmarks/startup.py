@@ -0,0 +1,126 @@
+"""Measure app import time and how long a fresh process takes to serve.
+
+Every run first times ``import main`` alone in a new interpreter, then
+starts uvicorn in a new process (so the lifespan warm-up runs and nothing
+is cached) and times, from process start, the first answer of
+/health/live, the first 200 from /health/ready and the first DB-backed
+request. ``--top`` also lists the slowest modules of ``-X importtime``.
+Needs the database from database.py. Run from the app directory:
+
+    python -m benchmarks.startup --runs 10 --top 15
+"""
+import argparse
+import socket
+import statistics
+import subprocess
+import sys
+import time
+
+import httpx
+
+POLL_INTERVAL = 0.005
+STARTUP_TIMEOUT = 60.0
+FIRST_QUERY_PATH = "/ads/"
+METRICS = ("import", "live", "ready", "first_query")
+IMPORT_PROBE = (
+    "import time; start = time.perf_counter(); import main; "
+    "print(time.perf_counter() - start)"
+)
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def wait_for(client, path, deadline, status=200):
+    while time.perf_counter() < deadline:
+        try:
+            if client.get(path).status_code == status:
+                return time.perf_counter()
+        except httpx.TransportError:
+            pass
+        time.sleep(POLL_INTERVAL)
+    raise TimeoutError(f"{path} did not answer {status} in time")
+
+
+def import_time():
+    output = subprocess.run(
+        [sys.executable, "-c", IMPORT_PROBE],
+        check=True,
+        capture_output=True,
+        text=True,
+    ).stdout
+    return float(output.splitlines()[-1])
+
+
+def slowest_imports(top):
+    # -X importtime writes "self | cumulative | module" lines to stderr.
+    report = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import main"],
+        check=True,
+        capture_output=True,
+        text=True,
+    ).stderr
+    modules = []
+    for line in report.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, module = line[len("import time:"):].split("|")
+        if cumulative.strip().isdigit():
+            modules.append((int(cumulative), module.rstrip()))
+    return sorted(modules, reverse=True)[:top]
+
+
+def run_once():
+    imported = import_time()
+    port = free_port()
+    start = time.perf_counter()
+    server = subprocess.Popen(
+        [
+            sys.executable, "-m", "uvicorn", "main:app",
+            "--port", str(port), "--log-level", "warning",
+        ],
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    try:
+        deadline = start + STARTUP_TIMEOUT
+        with httpx.Client(base_url=f"http://127.0.0.1:{port}") as client:
+            live = wait_for(client, "/health/live", deadline)
+            ready = wait_for(client, "/health/ready", deadline)
+            client.get(FIRST_QUERY_PATH).raise_for_status()
+            first_query = time.perf_counter()
+    finally:
+        server.terminate()
+        server.wait()
+    return {
+        "import": imported,
+        "live": live - start,
+        "ready": ready - start,
+        "first_query": first_query - start,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=0)
+    args = parser.parse_args()
+
+    if args.top:
+        for cumulative, module in slowest_imports(args.top):
+            print(f"{cumulative / 1000:9.1f} ms {module}")
+
+    results = [run_once() for _ in range(args.runs)]
+    for metric in METRICS:
+        timings = [result[metric] * 1000 for result in results]
+        print(
+            f"{metric:>14}: median {statistics.median(timings):7.1f} ms, "
+            f"min {min(timings):7.1f} ms, max {max(timings):7.1f} ms"
+        )
+
+
+if __name__ == "__main__":
+    main()
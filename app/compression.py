@@ -0,0 +1,178 @@
+import asyncio
+import zlib
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Bodies smaller than this are sent as is: headers would eat the gain.
+MINIMUM_SIZE = 500
+# Bodies (or stream chunks) at least this big are compressed in the
+# default executor so they do not stall the event loop.
+EXECUTOR_THRESHOLD = 256 * 1024
+# A compressed body must be at most this share of the original,
+# otherwise the payload is treated as incompressible and sent as is.
+MAX_RATIO = 0.9
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 4
+INCOMPRESSIBLE_TYPES = (
+    "image/", "video/", "audio/", "font/woff", "application/zip",
+    "application/gzip", "application/x-brotli", "application/octet-stream",
+)
+# Server-sent events go out as is, so their headers are sent right away
+# instead of waiting for the first event, as in Starlette's GZipMiddleware.
+PASSTHROUGH_TYPES = INCOMPRESSIBLE_TYPES + ("text/event-stream",)
+
+
+def choose_encoding(accept_encoding):
+    accepted = {}
+    for item in accept_encoding.split(","):
+        name, _, params = item.strip().partition(";")
+        quality = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        accepted[name.strip().lower()] = quality
+    if brotli is not None and accepted.get("br", 0) > 0:
+        return "br"
+    if accepted.get("gzip", 0) > 0:
+        return "gzip"
+    return None
+
+
+class _Compressor:
+    def __init__(self, encoding):
+        if encoding == "br":
+            self._compressor = brotli.Compressor(quality=BROTLI_QUALITY)
+        else:
+            self._compressor = zlib.compressobj(
+                GZIP_LEVEL, zlib.DEFLATED, zlib.MAX_WBITS | 16
+            )
+        self.encoding = encoding
+
+    def chunk(self, data):
+        # Flushed per chunk so every streamed chunk reaches the client now.
+        if self.encoding == "br":
+            return self._compressor.process(data) + self._compressor.flush()
+        return (
+            self._compressor.compress(data)
+            + self._compressor.flush(zlib.Z_SYNC_FLUSH)
+        )
+
+    def finish(self, data=b""):
+        if self.encoding == "br":
+            return self._compressor.process(data) + self._compressor.finish()
+        return self._compressor.compress(data) + self._compressor.flush()
+
+
+async def _run(function, data):
+    if len(data) >= EXECUTOR_THRESHOLD:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, function, data)
+    return function(data)
+
+
+class CompressionMiddleware:
+    """Compresses responses with brotli or gzip per Accept-Encoding.
+
+    Whole bodies under MINIMUM_SIZE or not shrinking below MAX_RATIO are
+    passed through. Streaming bodies are compressed chunk by chunk with no
+    size or ratio check, so only their content type can exclude them; their
+    response start is held back until the first chunk.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        accept_encoding = ""
+        for name, value in scope["headers"]:
+            if name == b"accept-encoding":
+                accept_encoding = value.decode("latin-1")
+        encoding = choose_encoding(accept_encoding)
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+        await self.app(scope, receive, _CompressingSender(send, encoding))
+
+
+class _CompressingSender:
+    def __init__(self, send, encoding):
+        self.send = send
+        self.encoding = encoding
+        self.start = None
+        self.compressor = None
+        self.passthrough = False
+
+    def _skip(self, headers):
+        for name, value in headers:
+            if name == b"content-encoding":
+                return True
+            if name == b"content-type" and value.decode(
+                    "latin-1").lower().startswith(PASSTHROUGH_TYPES):
+                return True
+        return False
+
+    async def _send_start(self, content_length=None):
+        headers = []
+        vary = [b"Accept-Encoding"]
+        for name, value in self.start["headers"]:
+            if name == b"vary":
+                vary.insert(0, value)
+            elif name != b"content-length":
+                headers.append((name, value))
+        headers.append((b"content-encoding", self.encoding.encode()))
+        headers.append((b"vary", b", ".join(vary)))
+        if content_length is not None:
+            headers.append((b"content-length", str(content_length).encode()))
+        await self.send({**self.start, "headers": headers})
+
+    async def __call__(self, message):
+        if message["type"] == "http.response.start":
+            self.start = message
+            self.passthrough = self._skip(message.get("headers", []))
+            if self.passthrough:
+                await self.send(message)
+            return
+        if message["type"] != "http.response.body" or self.passthrough:
+            await self.send(message)
+            return
+
+        body = message.get("body", b"")
+        more_body = message.get("more_body", False)
+
+        if self.compressor is None and not more_body:
+            await self._send_whole(body)
+            return
+
+        if self.compressor is None:
+            self.compressor = _Compressor(self.encoding)
+            await self._send_start()
+        if more_body:
+            body = await _run(self.compressor.chunk, body)
+        else:
+            body = await _run(self.compressor.finish, body)
+        await self.send({
+            "type": "http.response.body",
+            "body": body,
+            "more_body": more_body,
+        })
+
+    async def _send_whole(self, body):
+        if len(body) >= MINIMUM_SIZE:
+            compressed = await _run(_Compressor(self.encoding).finish, body)
+            if len(compressed) <= len(body) * MAX_RATIO:
+                await self._send_start(len(compressed))
+                await self.send(
+                    {"type": "http.response.body", "body": compressed}
+                )
+                return
+        await self.send(self.start)
+        await self.send({"type": "http.response.body", "body": body})
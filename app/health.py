@@ -0,0 +1,19 @@
+from fastapi import APIRouter, Request
+from fastapi.exceptions import HTTPException
+
+router_health = APIRouter(
+    tags=['health'],
+    prefix='/health',
+)
+
+
+@router_health.get('/live')
+async def live():
+    return {"status": "alive"}
+
+
+@router_health.get('/ready')
+async def ready(request: Request):
+    if not getattr(request.app.state, "ready", False):
+        raise HTTPException(status_code=503, detail="Warming up")
+    return {"status": "ready"}
@@ -1,26 +1,82 @@
-from fastapi_users import FastAPIUsers
+import asyncio
+import logging
+from contextlib import asynccontextmanager
 
 from fastapi import FastAPI
 
-
-from users.auth import auth_backend
-from users.models import User
-from users.manager import get_user_manager
+from compression import CompressionMiddleware
+from database import async_session_maker, engine, warm_up_pool
+from health import router_health
+from searches.index import SAVED_SEARCH_RELOAD_INTERVAL, saved_search_index
+from searches.routes import router_notifications, router_searches
+from users.auth import auth_backend, fastapi_users
 from users.schemas import UserRead, UserCreate
+from advertisements.dedup import DUPLICATE_RELOAD_INTERVAL, duplicate_index
+from advertisements.outbox import run_relay
+from advertisements.similarity import similarity_index
 from advertisements.routes import (
     router_categories, router_groups, router_ads, router_recalls,
     router_complaints
 )
+from advertisements.queries import hot_statements
 
+WARM_UP_RETRY_DELAY = 5
 
-app = FastAPI(title="Advertisement app")
+logger = logging.getLogger(__name__)
 
 
-fastapi_users = FastAPIUsers[User, int](
-    get_user_manager,
-    [auth_backend],
-)
-current_user = fastapi_users.current_user()
+async def warm_up(app: FastAPI):
+    while True:
+        try:
+            await warm_up_pool(hot_statements())
+            async with async_session_maker() as session:
+                await saved_search_index.load(session)
+                await duplicate_index.load(session)
+        except Exception:
+            logger.exception("Warm-up failed, retrying")
+            await asyncio.sleep(WARM_UP_RETRY_DELAY)
+        else:
+            break
+    app.state.ready = True
+
+
+async def reload_periodically(index, interval):
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            async with async_session_maker() as session:
+                await index.load(session)
+        except Exception:
+            logger.exception("Reloading %s failed", type(index).__name__)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Warm-up runs in the background so /health/live answers right away;
+    # /health/ready reports ready only once it has finished.
+    app.state.ready = False
+    similarity_index.open()
+    warm_up_task = asyncio.create_task(warm_up(app))
+    relay_task = asyncio.create_task(run_relay())
+    reload_tasks = [
+        asyncio.create_task(reload_periodically(
+            saved_search_index, SAVED_SEARCH_RELOAD_INTERVAL
+        )),
+        asyncio.create_task(reload_periodically(
+            duplicate_index, DUPLICATE_RELOAD_INTERVAL
+        )),
+    ]
+    yield
+    warm_up_task.cancel()
+    relay_task.cancel()
+    for task in reload_tasks:
+        task.cancel()
+    similarity_index.close()
+    await engine.dispose()
+
+
+app = FastAPI(title="Advertisement app", lifespan=lifespan)
+app.add_middleware(CompressionMiddleware)
 
 app.include_router(
     fastapi_users.get_auth_router(auth_backend),
@@ -34,8 +90,11 @@ app.include_router(
     tags=["auth"],
 )
 
+app.include_router(router_health)
 app.include_router(router_categories)
 app.include_router(router_groups)
 app.include_router(router_ads)
 app.include_router(router_recalls)
 app.include_router(router_complaints)
+app.include_router(router_searches)
+app.include_router(router_notifications)
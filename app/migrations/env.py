@@ -9,6 +9,7 @@ from alembic import context
 
 
 from users.models import Base
+import searches.models  # noqa: F401
 
 # this is the Alembic Config object, which provides
 # access to the values within the .ini file in use.
@@ -0,0 +1,33 @@
+"""group feed index
+
+Revision ID: 3f1c9a7e2b4d
+Revises: ab23b782d389
+Create Date: 2026-10-19 10:12:41.503217
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision: str = '3f1c9a7e2b4d'
+down_revision: Union[str, None] = 'ab23b782d389'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_index(
+        'ix_advertisement_group_id_pub_date_id',
+        'advertisement',
+        ['group_id', sa.text('pub_date DESC'), 'id'],
+        unique=False
+    )
+
+
+def downgrade() -> None:
+    op.drop_index(
+        'ix_advertisement_group_id_pub_date_id',
+        table_name='advertisement'
+    )
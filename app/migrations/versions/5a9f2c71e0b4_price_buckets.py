@@ -0,0 +1,53 @@
+"""price buckets
+
+Revision ID: 5a9f2c71e0b4
+Revises: e1b7d3c8a260
+Create Date: 2026-10-19 16:02:13.554901
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+from advertisements.price_stats import GROWTH
+
+
+revision: str = '5a9f2c71e0b4'
+down_revision: Union[str, None] = 'e1b7d3c8a260'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('price_bucket',
+    sa.Column('category_id', sa.Integer(), nullable=False),
+    sa.Column('type', sa.String(), nullable=False),
+    sa.Column('bucket', sa.Integer(), nullable=False),
+    sa.Column('count', sa.Integer(), nullable=False),
+    sa.Column('sum', sa.BigInteger(), nullable=False),
+    sa.Column('min', sa.Integer(), nullable=True),
+    sa.Column('max', sa.Integer(), nullable=True),
+    sa.ForeignKeyConstraint(['category_id'], ['category.id'], ),
+    sa.PrimaryKeyConstraint('category_id', 'type', 'bucket')
+    )
+    # Seeded with the aggregate advertisements.price_stats.rebuild()
+    # computes, so existing ads are counted from the start. The bucket
+    # expression mirrors price_stats.bucket().
+    op.execute(
+        'INSERT INTO price_bucket '
+        '(category_id, type, bucket, count, sum, min, max) '
+        'SELECT category_id, type, bucket, count(*), sum(price), '
+        'min(price), max(price) FROM ('
+        'SELECT category_id, type, price, CASE WHEN price < 1 THEN 0 '
+        'ELSE floor(ln(price::double precision) / '
+        f'ln({GROWTH}::double precision))::integer + 1 END AS bucket '
+        'FROM advertisement WHERE archived = false '
+        'AND category_id IS NOT NULL AND type IS NOT NULL '
+        'AND price IS NOT NULL'
+        ') AS priced GROUP BY category_id, type, bucket'
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('price_bucket')
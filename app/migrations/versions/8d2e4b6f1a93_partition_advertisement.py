@@ -0,0 +1,190 @@
+"""partition advertisement
+
+Revision ID: 8d2e4b6f1a93
+Revises: 3f1c9a7e2b4d
+Create Date: 2026-10-19 11:40:07.918452
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+revision: str = '8d2e4b6f1a93'
+down_revision: Union[str, None] = '3f1c9a7e2b4d'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# advertisement is list-partitioned by the archived flag. Live ads stay in
+# the small advertisement_hot partition, archived ads go to
+# advertisement_archive which is range-partitioned by pub_date; yearly
+# partitions there are created by the archiver (advertisements/archiver.py).
+# photo, recalls and complaint get the same flag and hot/archive split.
+# Postgres can not reference a partitioned table by id alone, so the
+# foreign keys to advertisement are dropped: the app deletes child rows in
+# the same transaction as their ad (queries.delete_ad_children).
+
+ADVERTISEMENT_COLUMNS = (
+    'id, title, type, author_id, description, pub_date, price, group_id, '
+    'category_id, is_active'
+)
+CHILD_COLUMNS = {
+    'photo': 'id, url, advertisement_id',
+    'recalls': 'id, author_id, advertisement_id, text',
+    'complaint': 'id, author_id, advertisement_id, text',
+}
+CHILD_DDL = {
+    'photo': '''
+        id integer NOT NULL DEFAULT nextval('photo_id_seq'),
+        url varchar,
+        advertisement_id integer,
+    ''',
+    'recalls': '''
+        id integer NOT NULL DEFAULT nextval('recalls_id_seq'),
+        author_id integer REFERENCES "user" (id),
+        advertisement_id integer,
+        text varchar,
+    ''',
+    'complaint': '''
+        id integer NOT NULL DEFAULT nextval('complaint_id_seq'),
+        author_id integer REFERENCES "user" (id),
+        advertisement_id integer,
+        text varchar,
+    ''',
+}
+
+
+def _detach(table: str) -> None:
+    op.execute(f'ALTER TABLE {table} RENAME TO {table}_old')
+    op.execute(f'ALTER INDEX {table}_pkey RENAME TO {table}_old_pkey')
+    op.execute(f'ALTER SEQUENCE {table}_id_seq OWNED BY NONE')
+
+
+def _attach(table: str, columns: str) -> None:
+    op.execute(
+        f'INSERT INTO {table} ({columns}) '
+        f'SELECT {columns} FROM {table}_old'
+    )
+    op.execute(f'DROP TABLE {table}_old')
+    op.execute(f'ALTER SEQUENCE {table}_id_seq OWNED BY {table}.id')
+
+
+def upgrade() -> None:
+    for table in CHILD_COLUMNS:
+        op.execute(
+            f'ALTER TABLE {table} '
+            f'DROP CONSTRAINT {table}_advertisement_id_fkey'
+        )
+
+    _detach('advertisement')
+    op.execute('DROP INDEX ix_advertisement_id')
+    op.execute('DROP INDEX ix_advertisement_group_id_pub_date_id')
+    op.execute('''
+        CREATE TABLE advertisement (
+            id integer NOT NULL DEFAULT nextval('advertisement_id_seq'),
+            title varchar,
+            type varchar,
+            author_id integer REFERENCES "user" (id),
+            description varchar,
+            pub_date timestamp NOT NULL
+                DEFAULT (now() AT TIME ZONE 'utc'),
+            price integer,
+            group_id integer REFERENCES "group" (id),
+            category_id integer REFERENCES category (id),
+            is_active boolean,
+            archived boolean NOT NULL DEFAULT false,
+            PRIMARY KEY (id, archived, pub_date)
+        ) PARTITION BY LIST (archived)
+    ''')
+    op.execute(
+        'CREATE TABLE advertisement_hot PARTITION OF advertisement '
+        'FOR VALUES IN (false)'
+    )
+    op.execute(
+        'CREATE TABLE advertisement_archive PARTITION OF advertisement '
+        'FOR VALUES IN (true) PARTITION BY RANGE (pub_date)'
+    )
+    op.execute(
+        'CREATE TABLE advertisement_archive_default '
+        'PARTITION OF advertisement_archive DEFAULT'
+    )
+    op.execute('CREATE INDEX ix_advertisement_id ON advertisement (id)')
+    op.execute(
+        'CREATE INDEX ix_advertisement_group_id_pub_date_id '
+        'ON advertisement (group_id, pub_date DESC, id)'
+    )
+    op.execute(
+        "UPDATE advertisement_old SET pub_date = now() AT TIME ZONE 'utc' "
+        "WHERE pub_date IS NULL"
+    )
+    _attach('advertisement', ADVERTISEMENT_COLUMNS)
+
+    for table, columns in CHILD_COLUMNS.items():
+        _detach(table)
+        op.execute(f'''
+            CREATE TABLE {table} (
+                {CHILD_DDL[table]}
+                archived boolean NOT NULL DEFAULT false,
+                PRIMARY KEY (id, archived)
+            ) PARTITION BY LIST (archived)
+        ''')
+        op.execute(
+            f'CREATE TABLE {table}_hot PARTITION OF {table} '
+            f'FOR VALUES IN (false)'
+        )
+        op.execute(
+            f'CREATE TABLE {table}_archive PARTITION OF {table} '
+            f'FOR VALUES IN (true)'
+        )
+        op.execute(
+            f'CREATE INDEX ix_{table}_advertisement_id '
+            f'ON {table} (advertisement_id)'
+        )
+        _attach(table, columns)
+    op.execute('CREATE INDEX ix_photo_id ON photo (id)')
+
+
+def downgrade() -> None:
+    op.execute('DROP INDEX IF EXISTS ix_photo_id')
+    for table, columns in CHILD_COLUMNS.items():
+        _detach(table)
+        op.execute(f'''
+            CREATE TABLE {table} (
+                {CHILD_DDL[table]}
+                PRIMARY KEY (id)
+            )
+        ''')
+        _attach(table, columns)
+    op.execute('CREATE INDEX ix_photo_id ON photo (id)')
+
+    _detach('advertisement')
+    op.execute('DROP INDEX ix_advertisement_id')
+    op.execute('DROP INDEX ix_advertisement_group_id_pub_date_id')
+    op.execute('''
+        CREATE TABLE advertisement (
+            id integer NOT NULL DEFAULT nextval('advertisement_id_seq'),
+            title varchar,
+            type varchar,
+            author_id integer REFERENCES "user" (id),
+            description varchar,
+            pub_date timestamp,
+            price integer,
+            group_id integer REFERENCES "group" (id),
+            category_id integer REFERENCES category (id),
+            is_active boolean,
+            PRIMARY KEY (id)
+        )
+    ''')
+    op.execute('CREATE INDEX ix_advertisement_id ON advertisement (id)')
+    op.execute(
+        'CREATE INDEX ix_advertisement_group_id_pub_date_id '
+        'ON advertisement (group_id, pub_date DESC, id)'
+    )
+    _attach('advertisement', ADVERTISEMENT_COLUMNS)
+
+    for table in CHILD_COLUMNS:
+        op.execute(
+            f'ALTER TABLE {table} ADD CONSTRAINT '
+            f'{table}_advertisement_id_fkey FOREIGN KEY (advertisement_id) '
+            f'REFERENCES advertisement (id)'
+        )
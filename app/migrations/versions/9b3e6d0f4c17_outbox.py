@@ -0,0 +1,35 @@
+"""outbox
+
+Revision ID: 9b3e6d0f4c17
+Revises: 5a9f2c71e0b4
+Create Date: 2026-10-19 17:24:48.310562
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision: str = '9b3e6d0f4c17'
+down_revision: Union[str, None] = '5a9f2c71e0b4'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('outbox',
+    sa.Column('id', sa.BigInteger(), nullable=False),
+    sa.Column('idempotency_key', sa.String(), nullable=False),
+    sa.Column('aggregate', sa.String(), nullable=False),
+    sa.Column('aggregate_id', sa.Integer(), nullable=True),
+    sa.Column('event', sa.String(), nullable=False),
+    sa.Column('payload', sa.JSON(), nullable=True),
+    sa.Column('created_at', sa.TIMESTAMP(), nullable=True),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('idempotency_key')
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('outbox')
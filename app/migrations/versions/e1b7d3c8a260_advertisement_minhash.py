@@ -0,0 +1,27 @@
+"""advertisement minhash
+
+Revision ID: e1b7d3c8a260
+Revises: c47a0e95d2f8
+Create Date: 2026-10-19 14:31:55.206417
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision: str = 'e1b7d3c8a260'
+down_revision: Union[str, None] = 'c47a0e95d2f8'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('advertisement', sa.Column('minhash', sa.LargeBinary(), nullable=True))
+    op.add_column('advertisement', sa.Column('duplicate_of_id', sa.Integer(), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column('advertisement', 'duplicate_of_id')
+    op.drop_column('advertisement', 'minhash')
@@ -0,0 +1,164 @@
+import re
+from collections import defaultdict
+from typing import FrozenSet, NamedTuple, Optional
+
+from sqlalchemy import select
+
+from .models import SavedSearch
+
+# Prices are bucketed by bit length, so every band covers a doubling
+# of price and a search range maps onto a handful of bands.
+MAX_PRICE_BAND = 64
+# Every worker keeps its own copy of the index and only applies the search
+# writes it serves itself. A full reload this often makes searches created,
+# edited or deleted through other workers take effect after at most this
+# many seconds.
+SAVED_SEARCH_RELOAD_INTERVAL = 30
+
+WORD_RE = re.compile(r"\w+")
+
+
+def words(text):
+    return set(WORD_RE.findall((text or "").lower()))
+
+
+def price_band(price):
+    return max(price or 0, 0).bit_length()
+
+
+def enum_value(value):
+    return getattr(value, "value", value)
+
+
+class Predicate(NamedTuple):
+    id: int
+    user_id: int
+    category_id: Optional[int]
+    type: Optional[str]
+    min_price: Optional[int]
+    max_price: Optional[int]
+    keywords: FrozenSet[str]
+
+    @classmethod
+    def from_search(cls, search):
+        return cls(
+            id=search.id,
+            user_id=search.user_id,
+            category_id=search.category_id,
+            type=enum_value(search.type),
+            min_price=search.min_price,
+            max_price=search.max_price,
+            keywords=frozenset(words(search.keywords)),
+        )
+
+    def bands(self):
+        if self.min_price is None and self.max_price is None:
+            return [None]
+        low = price_band(self.min_price)
+        high = MAX_PRICE_BAND
+        if self.max_price is not None:
+            high = price_band(self.max_price)
+        return list(range(low, high + 1))
+
+    def keyword(self):
+        # Longer words tend to be rarer, so they make better index keys.
+        if not self.keywords:
+            return None
+        return max(self.keywords, key=lambda word: (len(word), word))
+
+    def matches(self, ad, ad_words):
+        price = ad.get("price")
+        return (
+            self.category_id in (None, ad.get("category_id"))
+            and self.type in (None, enum_value(ad.get("type")))
+            and (self.min_price is None or (
+                price is not None and price >= self.min_price))
+            and (self.max_price is None or (
+                price is not None and price <= self.max_price))
+            and self.keywords <= ad_words
+        )
+
+
+class SavedSearchIndex:
+    """In-memory inverted index of saved search predicates.
+
+    Every search is filed under its category, type, price bands and one of
+    its keywords (None stands for "any"). A new ad only intersects the few
+    posting sets it falls into and the full predicate is checked on the
+    remaining candidates.
+    """
+
+    def __init__(self):
+        self.clear()
+
+    def clear(self):
+        self.predicates = {}
+        self.by_category = defaultdict(set)
+        self.by_type = defaultdict(set)
+        self.by_band = defaultdict(set)
+        self.by_keyword = defaultdict(set)
+
+    def _postings(self, predicate):
+        yield self.by_category, predicate.category_id
+        yield self.by_type, predicate.type
+        for band in predicate.bands():
+            yield self.by_band, band
+        yield self.by_keyword, predicate.keyword()
+
+    def add(self, search):
+        self.remove(search.id)
+        predicate = Predicate.from_search(search)
+        self.predicates[predicate.id] = predicate
+        for postings, key in self._postings(predicate):
+            postings[key].add(predicate.id)
+
+    def remove(self, search_id):
+        predicate = self.predicates.pop(search_id, None)
+        if predicate is None:
+            return
+        for postings, key in self._postings(predicate):
+            postings[key].discard(search_id)
+            if not postings[key]:
+                del postings[key]
+
+    def _lookup(self, postings, *keys):
+        found = set()
+        for key in keys:
+            found |= postings.get(key, set())
+        return found
+
+    def candidates(self, ad, ad_words):
+        candidates = self._lookup(
+            self.by_category, None, ad.get("category_id")
+        )
+        if candidates:
+            candidates &= self._lookup(
+                self.by_type, None, enum_value(ad.get("type"))
+            )
+        if candidates:
+            candidates &= self._lookup(
+                self.by_band, None, price_band(ad.get("price"))
+            )
+        if candidates:
+            candidates &= self._lookup(self.by_keyword, None, *ad_words)
+        return candidates
+
+    def match(self, ad):
+        ad_words = words(ad.get("title")) | words(ad.get("description"))
+        return [
+            self.predicates[search_id]
+            for search_id in self.candidates(ad, ad_words)
+            if self.predicates[search_id].user_id != ad.get("author_id")
+            and self.predicates[search_id].matches(ad, ad_words)
+        ]
+
+    async def load(self, session):
+        # Everything is fetched before clearing and the rebuild does not
+        # await, so concurrent matches never see a half-built index.
+        searches = await session.execute(select(SavedSearch))
+        self.clear()
+        for search in searches.scalars().all():
+            self.add(search)
+
+
+saved_search_index = SavedSearchIndex()
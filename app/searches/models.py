@@ -0,0 +1,34 @@
+import datetime
+
+from sqlalchemy import Column, ForeignKey, Index, Integer, String, TIMESTAMP
+
+from advertisements.models import Base
+
+
+class SavedSearch(Base):
+    __tablename__ = "saved_search"
+
+    id = Column(Integer, primary_key=True)
+    user_id = Column(Integer, ForeignKey("user.id"), index=True)
+    category_id = Column(Integer, ForeignKey("category.id"))
+    type = Column(String)
+    min_price = Column(Integer)
+    max_price = Column(Integer)
+    keywords = Column(String)
+    created_at = Column(TIMESTAMP, default=datetime.datetime.utcnow)
+
+
+class Notification(Base):
+    __tablename__ = "notification"
+
+    id = Column(Integer, primary_key=True)
+    user_id = Column(Integer, ForeignKey("user.id"))
+    saved_search_id = Column(
+        Integer, ForeignKey("saved_search.id", ondelete="CASCADE")
+    )
+    advertisement_id = Column(Integer)
+    created_at = Column(TIMESTAMP, default=datetime.datetime.utcnow)
+
+
+# Polling reads a user's notifications after a cursor id.
+Index("ix_notification_user_id_id", Notification.user_id, Notification.id)
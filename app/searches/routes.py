@@ -0,0 +1,125 @@
+from typing import List
+
+from fastapi import APIRouter, Depends
+from fastapi.exceptions import HTTPException
+from sqlalchemy import insert, select, delete, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from database import get_async_session
+from .index import saved_search_index
+from .models import Notification, SavedSearch
+from .schemas import NotificationRead, SavedSearchCreate, SavedSearchRead
+from users.auth import current_user
+from users.models import User
+
+
+router_searches = APIRouter(
+    tags=['searches'],
+    prefix='/searches',
+)
+
+
+async def get_own_search(id, user, session):
+    search = await session.execute(
+        select(SavedSearch).where(
+            SavedSearch.id == id, SavedSearch.user_id == user.id
+        )
+    )
+    search = search.scalar_one_or_none()
+    if search is None:
+        raise HTTPException(
+            status_code=404, detail="This saved search is not exists"
+        )
+    return search
+
+
+@router_searches.get('/', response_model=List[SavedSearchRead])
+async def get_searches(
+    user: User = Depends(current_user),
+    session: AsyncSession = Depends(get_async_session)
+):
+    searches = await session.execute(
+        select(SavedSearch).where(SavedSearch.user_id == user.id)
+    )
+    return searches.scalars().all()
+
+
+@router_searches.post('/')
+async def create_search(
+    request: SavedSearchCreate,
+    user: User = Depends(current_user),
+    session: AsyncSession = Depends(get_async_session)
+):
+    search_data = request.dict()
+    search_data["user_id"] = user.id
+    search = await session.execute(
+        insert(SavedSearch).values(**search_data).returning(SavedSearch)
+    )
+    search = search.scalar()
+    await session.commit()
+    saved_search_index.add(search)
+    return {"status": "success", "saved_search": search.id}
+
+
+@router_searches.get('/{id}/', response_model=SavedSearchRead)
+async def get_search(
+    id: int,
+    user: User = Depends(current_user),
+    session: AsyncSession = Depends(get_async_session)
+):
+    return await get_own_search(id, user, session)
+
+
+@router_searches.patch('/{id}/')
+async def update_search(
+    id: int,
+    request: SavedSearchCreate,
+    user: User = Depends(current_user),
+    session: AsyncSession = Depends(get_async_session)
+):
+    search = await get_own_search(id, user, session)
+    update_data = request.dict(exclude_unset=True)
+    if update_data:
+        await session.execute(
+            update(SavedSearch).where(SavedSearch.id == id).values(
+                update_data
+            )
+        )
+        await session.commit()
+    await session.refresh(search)
+    saved_search_index.add(search)
+    return {"status": "success"}
+
+
+@router_searches.delete('/{id}/')
+async def delete_search(
+    id: int,
+    user: User = Depends(current_user),
+    session: AsyncSession = Depends(get_async_session)
+):
+    await get_own_search(id, user, session)
+    await session.execute(delete(SavedSearch).where(SavedSearch.id == id))
+    await session.commit()
+    saved_search_index.remove(id)
+    return {"status": "success"}
+
+
+router_notifications = APIRouter(
+    tags=['notifications'],
+    prefix='/notifications',
+)
+
+
+@router_notifications.get('/', response_model=List[NotificationRead])
+async def get_notifications(
+    user: User = Depends(current_user),
+    session: AsyncSession = Depends(get_async_session),
+    after_id: int = 0,
+    limit: int = 20
+):
+    notifications = await session.execute(
+        select(Notification).where(
+            Notification.user_id == user.id, Notification.id > after_id
+        ).order_by(Notification.id).limit(limit)
+    )
+    return notifications.scalars().all()
@@ -0,0 +1,31 @@
+from datetime import datetime
+from typing import Optional
+
+from pydantic import BaseModel
+
+from advertisements.schemas import AdvertisementType
+
+
+class SavedSearchCreate(BaseModel):
+    category_id: Optional[int] = None
+    type: Optional[AdvertisementType] = None
+    min_price: Optional[int] = None
+    max_price: Optional[int] = None
+    keywords: Optional[str] = None
+
+
+class SavedSearchRead(SavedSearchCreate):
+    id: int
+
+    class Config:
+        orm_mode = True
+
+
+class NotificationRead(BaseModel):
+    id: int
+    saved_search_id: int
+    advertisement_id: int
+    created_at: datetime
+
+    class Config:
+        orm_mode = True
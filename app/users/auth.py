@@ -1,7 +1,11 @@
+from fastapi_users import FastAPIUsers
 from fastapi_users.authentication import (
     AuthenticationBackend, CookieTransport, JWTStrategy
 )
 
+from .manager import get_user_manager
+from .models import User
+
 cookie_transport = CookieTransport(
     cookie_name="advertisements",
     cookie_max_age=3600
@@ -19,3 +23,9 @@ auth_backend = AuthenticationBackend(
     transport=cookie_transport,
     get_strategy=get_jwt_strategy,
 )
+
+fastapi_users = FastAPIUsers[User, int](
+    get_user_manager,
+    [auth_backend],
+)
+current_user = fastapi_users.current_user()